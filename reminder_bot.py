@@ -7,15 +7,21 @@ Automated follow-up for unpaid invoices
 import os
 import sys
 import argparse
+import bisect
 import json
+import queue
 import smtplib
+import ssl
+import string
+import tempfile
+import threading
 import time
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
-import schedule
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
 try:
     import stripe
@@ -23,88 +29,361 @@ try:
 except ImportError:
     STRIPE_AVAILABLE = False
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 load_dotenv()
 
+# Failures a long-running loop can sit out until the next interval
+TRANSIENT_ERRORS = (smtplib.SMTPException, OSError)
+
+if STRIPE_AVAILABLE:
+    TRANSIENT_STRIPE_ERRORS = (stripe.error.RateLimitError, stripe.error.APIConnectionError)
+    TRANSIENT_ERRORS += TRANSIENT_STRIPE_ERRORS
+    # Back off and retry Stripe calls that fail for transient reasons
+    stripe_retry = retry(
+        retry=retry_if_exception_type(TRANSIENT_STRIPE_ERRORS),
+        wait=wait_exponential(min=1, max=30),
+        stop=stop_after_attempt(5),
+        reraise=True
+    )
+else:
+    def stripe_retry(func):
+        return func
+
+SECONDS_PER_DAY = 86400
+SMTP_SSL_PORT = 465
+CUSTOMER_LOOKUP_WORKERS = 16
+
+# Invoice events that can move an invoice into or out of the open, unpaid set
+INVOICE_EVENT_TYPES = [
+    'invoice.created',
+    'invoice.finalized',
+    'invoice.updated',
+    'invoice.paid',
+    'invoice.voided',
+    'invoice.marked_uncollectible',
+    'invoice.deleted',
+]
+# Stripe keeps events for 30 days; older cursors need a full resync
+EVENT_RETENTION_SECONDS = 29 * SECONDS_PER_DAY
+# Resync cursors start this far back to absorb clock skew against Stripe
+EVENT_RESYNC_MARGIN_SECONDS = 300
+
+
+def _quit_quietly(server: smtplib.SMTP):
+    """Close an SMTP connection, ignoring errors from a dead socket"""
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        pass
+    finally:
+        # quit() skips close() when QUIT itself fails
+        server.close()
+
+
+class SMTPPool:
+    """Bounded pool of authenticated SMTP connections
+    
+    Connections are opened lazily on first acquire, so a batch only pays
+    for as many handshakes as it has concurrent sends. Each connection is
+    rotated after max_msgs sends so providers that cap messages per
+    connection never close it on us mid-batch.
+    """
+    
+    def __init__(self, connect: Callable[[], smtplib.SMTP], size: int = 5, max_msgs: int = 100):
+        self._connect = connect
+        self.max_msgs = max_msgs
+        self._idle = queue.Queue(maxsize=size)
+        self._sent = {}
+        for _ in range(size):
+            self._idle.put(None)
+    
+    def acquire(self) -> smtplib.SMTP:
+        """Take a connection from the pool, blocking until one is free"""
+        server = self._idle.get()
+        if server is None:
+            try:
+                server = self._connect()
+            except Exception:
+                self._idle.put(None)
+                raise
+            self._sent[server] = 0
+        return server
+    
+    def release(self, server: smtplib.SMTP, broken: bool = False):
+        """Return a connection to the pool after one send"""
+        sent = self._sent.pop(server, 0) + 1
+        if broken or sent >= self.max_msgs:
+            _quit_quietly(server)
+            self._idle.put(None)
+        else:
+            self._sent[server] = sent
+            self._idle.put(server)
+    
+    def close(self):
+        """Close every idle connection in the pool"""
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if server is not None:
+                _quit_quietly(server)
+        self._sent.clear()
+
+
 class InvoiceReminderBot:
     def __init__(self):
         self.stripe_key = os.getenv('STRIPE_SECRET_KEY')
         if STRIPE_AVAILABLE and self.stripe_key:
             stripe.api_key = self.stripe_key
+            # Keep-alive sessions reuse TLS connections across paginated and per-customer calls
+            stripe.default_http_client = stripe.http_client.RequestsClient()
+            # Retries are left to stripe_retry, which wraps every Stripe call;
+            # SDK retries on top would multiply the attempts per request
+            stripe.max_network_retries = 0
         
         # Email settings
         self.smtp_host = os.getenv('SMTP_HOST', 'smtp.gmail.com')
         self.smtp_port = int(os.getenv('SMTP_PORT', 587))
         self.smtp_user = os.getenv('SMTP_USER')
         self.smtp_password = os.getenv('SMTP_PASSWORD')
+        # Built once: loading the CA bundle is the expensive part of a context
+        self._ssl_ctx = ssl.create_default_context()
+        self.smtp_pool_size = int(os.getenv('SMTP_POOL_SIZE', 5))
+        self.smtp_max_msgs = int(os.getenv('SMTP_MAX_MSGS', 100))
+        self._pool = None
+        self._state_lock = threading.Lock()
         
         # Reminder settings
         reminder_days_str = os.getenv('REMINDER_DAYS', '7,14,21')
-        self.reminder_days = [int(d) for d in reminder_days_str.split(',')]
+        self.reminder_days = sorted(int(d) for d in reminder_days_str.split(','))
+        self._thresholds = tuple(self.reminder_days)
         self.max_reminders = int(os.getenv('MAX_REMINDERS', 3))
         
+        # Email bodies are compiled once; each send only substitutes the fields
+        self._text_tpl = string.Template("""
+            Hello,
+            
+            This is a friendly reminder that payment is due for Invoice $number.
+            
+            Amount Due: $currency $amount
+            $overdue
+            
+            Please make payment at your earliest convenience.
+            
+            Thank you,
+            Invoice Reminder Bot
+            """)
+        self._html_tpl = string.Template("""
+            <html>
+              <body>
+                <p>Hello,</p>
+                <p>This is a friendly reminder that payment is due for Invoice <strong>$number</strong>.</p>
+                <p><strong>Amount Due:</strong> $currency $amount</p>
+                $overdue
+                <p>Please make payment at your earliest convenience.</p>
+                <p>Thank you,<br>Invoice Reminder Bot</p>
+              </body>
+            </html>
+            """)
+        
         self.state_file = 'invoice_state.json'
         self.state = self.load_state()
+        self._customer_cache = {}
     
     def load_state(self) -> Dict:
         """Load invoice reminder state"""
         if os.path.exists(self.state_file):
-            with open(self.state_file, 'r') as f:
-                return json.load(f)
-        return {'invoices': {}}
+            with open(self.state_file, 'rb') as f:
+                data = f.read()
+            state = orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+            state.setdefault('customers', {})
+            return state
+        return {'invoices': {}, 'customers': {}}
     
     def save_state(self):
-        """Save invoice reminder state"""
-        with open(self.state_file, 'w') as f:
-            json.dump(self.state, f, indent=2)
+        """Save invoice reminder state
+        
+        The state is written and fsynced to a temporary file, then renamed
+        over the old one, so a crash or power loss mid-write never leaves a
+        truncated state file.
+        """
+        if ORJSON_AVAILABLE:
+            data = orjson.dumps(self.state, option=orjson.OPT_INDENT_2)
+        else:
+            data = json.dumps(self.state, indent=2).encode()
+        
+        state_dir = os.path.dirname(os.path.abspath(self.state_file))
+        tmp = tempfile.NamedTemporaryFile('wb', dir=state_dir, suffix='.tmp', delete=False)
+        try:
+            with tmp:
+                tmp.write(data)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp.name, self.state_file)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
     
-    def get_unpaid_invoices(self) -> List[Dict]:
-        """Get unpaid invoices from Stripe"""
+    def _invoice_row(self, invoice) -> Dict:
+        """Convert a Stripe invoice into the dict used throughout the bot"""
+        customer = invoice.customer
+        if isinstance(customer, str):
+            customer_id, customer_email = customer, None
+        else:
+            customer_id, customer_email = customer.id, getattr(customer, 'email', None)
+        return {
+            'id': invoice.id,
+            'customer_id': customer_id,
+            'amount_due': invoice.amount_due / 100,  # Convert from cents
+            'currency': invoice.currency.upper(),
+            'due_date': invoice.due_date,
+            'customer_email': invoice.customer_email or customer_email,
+            'number': invoice.number,
+            'created': invoice.created
+        }
+    
+    def get_unpaid_invoices(self, due_before: Optional[int] = None) -> Iterator[Dict]:
+        """Stream unpaid invoices from Stripe
+        
+        Follows Stripe pagination so no open invoice is dropped. When
+        due_before (epoch seconds) is given, only invoices due on or before
+        it are requested from the API. Each page is retried on rate limits
+        and connection errors; any other failure propagates.
+        """
         if not STRIPE_AVAILABLE or not self.stripe_key:
             print("⚠️  Stripe not configured")
-            return []
+            return
         
-        try:
-            invoices = stripe.Invoice.list(
-                status='open',
-                limit=100
-            )
-            
-            unpaid = []
-            for invoice in invoices.data:
+        # Expanding the customer delivers its email with the invoice page
+        params = {'status': 'open', 'limit': 100, 'expand': ['data.customer']}
+        if due_before is not None:
+            params['due_date'] = {'lte': due_before}
+        
+        while True:
+            page = self._list_invoices(**params)
+            for invoice in page.data:
                 if invoice.amount_due > 0:
-                    unpaid.append({
-                        'id': invoice.id,
-                        'customer_id': invoice.customer,
-                        'amount_due': invoice.amount_due / 100,  # Convert from cents
-                        'currency': invoice.currency.upper(),
-                        'due_date': invoice.due_date,
-                        'customer_email': invoice.customer_email,
-                        'number': invoice.number,
-                        'created': invoice.created
-                    })
-            
-            return unpaid
-        except Exception as e:
-            print(f"❌ Error fetching invoices: {e}")
-            return []
+                    yield self._invoice_row(invoice)
+            if not page.has_more or not page.data:
+                break
+            params['starting_after'] = page.data[-1].id
+    
+    @stripe_retry
+    def _list_invoices(self, **params):
+        """Fetch one page of invoices from Stripe"""
+        return stripe.Invoice.list(**params)
+    
+    @stripe_retry
+    def _list_events(self, **params):
+        """Fetch one page of events from Stripe"""
+        return stripe.Event.list(**params)
+    
+    @stripe_retry
+    def _retrieve_customer(self, customer_id: str):
+        """Fetch one customer from Stripe"""
+        return stripe.Customer.retrieve(customer_id)
     
     def get_customer_info(self, customer_id: str) -> Optional[Dict]:
-        """Get customer information"""
+        """Get customer information
+        
+        Results are cached for the life of the process and saved in the
+        state file, which is used as a fallback when Stripe rate-limits us.
+        """
         if not STRIPE_AVAILABLE or not self.stripe_key:
             return None
         
+        if customer_id in self._customer_cache:
+            return self._customer_cache[customer_id]
+        
         try:
-            customer = stripe.Customer.retrieve(customer_id)
-            return {
-                'email': customer.email,
-                'name': customer.name,
-                'id': customer.id
-            }
-        except Exception as e:
+            customer = self._retrieve_customer(customer_id)
+        except stripe.error.RateLimitError:
+            print(f"⚠️  Rate limited fetching customer {customer_id}, using saved details")
+            return self.state['customers'].get(customer_id)
+        except stripe.error.StripeError as e:
             print(f"❌ Error fetching customer: {e}")
             return None
+        
+        info = {
+            'email': customer.email,
+            'name': customer.name,
+            'id': customer.id
+        }
+        self._customer_cache[customer_id] = info
+        with self._state_lock:
+            self.state['customers'][customer_id] = info
+        return info
+    
+    def _fill_customer_emails(self, invoices: List[Dict]):
+        """Look up missing customer emails for a batch of invoices in parallel"""
+        missing = list({inv['customer_id'] for inv in invoices if not inv.get('customer_email')})
+        if not missing:
+            return
+        
+        workers = min(CUSTOMER_LOOKUP_WORKERS, len(missing))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            customers = dict(zip(missing, executor.map(self.get_customer_info, missing)))
+        
+        for invoice in invoices:
+            if not invoice.get('customer_email'):
+                customer_info = customers.get(invoice['customer_id'])
+                if customer_info:
+                    invoice['customer_email'] = customer_info['email']
+    
+    def _connect_smtp(self) -> smtplib.SMTP:
+        """Open an authenticated SMTP connection
+        
+        Port 465 uses implicit TLS, which saves the EHLO/STARTTLS round
+        trips; any other port upgrades a plain connection with STARTTLS.
+        """
+        if self.smtp_port == SMTP_SSL_PORT:
+            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=self._ssl_ctx)
+        else:
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+        try:
+            if self.smtp_port != SMTP_SSL_PORT:
+                server.ehlo()
+                server.starttls(context=self._ssl_ctx)
+                server.ehlo()
+            server.login(self.smtp_user, self.smtp_password)
+        except Exception:
+            # Don't leak the connected socket when the handshake fails
+            _quit_quietly(server)
+            raise
+        return server
+    
+    def _open_pool(self, size: int):
+        """Open the SMTP connection pool used by send_reminder_email"""
+        self._pool = SMTPPool(self._connect_smtp, size, self.smtp_max_msgs)
+    
+    def _close_pool(self):
+        """Close the SMTP connection pool if one is open"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+    
+    def _deliver(self, msg: EmailMessage):
+        """Send a message over a pooled connection, retrying once if it dropped"""
+        for attempt in (1, 2):
+            server = self._pool.acquire()
+            try:
+                server.send_message(msg)
+            except Exception as e:
+                self._pool.release(server, broken=True)
+                stale = isinstance(e, (smtplib.SMTPServerDisconnected, ConnectionError))
+                if attempt == 2 or not stale:
+                    raise
+            else:
+                self._pool.release(server)
+                return
     
-    def send_reminder_email(self, invoice: Dict, reminder_number: int) -> bool:
+    def send_reminder_email(self, invoice: Dict, reminder_number: int, now_ts: Optional[int] = None) -> bool:
         """Send reminder email for unpaid invoice"""
         if not self.smtp_user or not self.smtp_password:
             print("⚠️  Email not configured")
@@ -121,55 +400,36 @@ class InvoiceReminderBot:
             return False
         
         try:
-            msg = MIMEMultipart('alternative')
+            msg = EmailMessage()
             msg['From'] = self.smtp_user
             msg['To'] = customer_email
-            msg['Subject'] = f"Reminder: Payment Due for Invoice {invoice.get('number', invoice['id'])}"
             
-            due_date = datetime.fromtimestamp(invoice['due_date']) if invoice.get('due_date') else None
-            days_overdue = (datetime.now() - due_date).days if due_date else 0
+            if now_ts is None:
+                now_ts = int(time.time())
+            due_ts = invoice.get('due_date')
+            days_overdue = (now_ts - due_ts) // SECONDS_PER_DAY if due_ts else 0
             
-            text = f"""
-            Hello,
-            
-            This is a friendly reminder that payment is due for Invoice {invoice.get('number', invoice['id'])}.
-            
-            Amount Due: {invoice['currency']} {invoice['amount_due']:.2f}
-            {'Days Overdue: ' + str(days_overdue) if days_overdue > 0 else ''}
-            
-            Please make payment at your earliest convenience.
-            
-            Thank you,
-            Invoice Reminder Bot
-            """
+            number = invoice.get('number', invoice['id'])
+            fields = {
+                'number': number,
+                'currency': invoice['currency'],
+                'amount': f"{invoice['amount_due']:.2f}"
+            }
+            overdue = days_overdue > 0
+            msg['Subject'] = f"Reminder: Payment Due for Invoice {number}"
             
-            html = f"""
-            <html>
-              <body>
-                <p>Hello,</p>
-                <p>This is a friendly reminder that payment is due for Invoice <strong>{invoice.get('number', invoice['id'])}</strong>.</p>
-                <p><strong>Amount Due:</strong> {invoice['currency']} {invoice['amount_due']:.2f}</p>
-                {f'<p><strong>Days Overdue:</strong> {days_overdue}</p>' if days_overdue > 0 else ''}
-                <p>Please make payment at your earliest convenience.</p>
-                <p>Thank you,<br>Invoice Reminder Bot</p>
-              </body>
-            </html>
-            """
+            text = self._text_tpl.substitute(
+                fields, overdue=f'Days Overdue: {days_overdue}' if overdue else '')
+            html = self._html_tpl.substitute(
+                fields, overdue=f'<p><strong>Days Overdue:</strong> {days_overdue}</p>' if overdue else '')
             
-            part1 = MIMEText(text, 'plain')
-            part2 = MIMEText(html, 'html')
+            msg.set_content(text)
+            msg.add_alternative(html, subtype='html')
             
-            msg.attach(part1)
-            msg.attach(part2)
-            
-            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_user, self.smtp_password)
-            server.send_message(msg)
-            server.quit()
+            self._deliver(msg)
             
             return True
-        except Exception as e:
+        except (smtplib.SMTPException, OSError) as e:
             print(f"❌ Error sending email: {e}")
             return False
     
@@ -177,78 +437,147 @@ class InvoiceReminderBot:
         """Check for unpaid invoices and send reminders"""
         print("🔍 Checking for unpaid invoices...")
         
-        unpaid_invoices = self.get_unpaid_invoices()
-        print(f"Found {len(unpaid_invoices)} unpaid invoice(s)")
+        # One clock reading for the whole pass keeps every invoice's day count consistent
+        now_ts = int(time.time())
+        now_iso = datetime.fromtimestamp(now_ts).isoformat()
         
-        for invoice in unpaid_invoices:
-            invoice_id = invoice['id']
-            due_date = datetime.fromtimestamp(invoice['due_date']) if invoice.get('due_date') else None
-            
-            if not due_date:
-                continue
-            
-            days_since_due = (datetime.now() - due_date).days
-            
-            # Initialize invoice state if needed
-            if invoice_id not in self.state['invoices']:
-                self.state['invoices'][invoice_id] = {
-                    'reminders_sent': 0,
-                    'last_reminder': None
-                }
-            
-            invoice_state = self.state['invoices'][invoice_id]
-            reminders_sent = invoice_state['reminders_sent']
-            
-            # Check if reminder should be sent
-            should_remind = False
-            reminder_number = 0
-            
-            for i, days in enumerate(self.reminder_days, 1):
-                if days_since_due >= days and reminders_sent < i and reminders_sent < self.max_reminders:
-                    should_remind = True
-                    reminder_number = i
-                    break
-            
-            if should_remind:
-                print(f"📧 Sending reminder #{reminder_number} for invoice {invoice.get('number', invoice_id)}")
-                
-                if self.send_reminder_email(invoice, reminder_number):
+        # The same cutoff filters server-side here and locally in _remind_batch
+        cutoff_ts = self._reminder_cutoff(now_ts)
+        unpaid_invoices = list(self.get_unpaid_invoices(due_before=cutoff_ts))
+        print(f"Found {len(unpaid_invoices)} unpaid invoice(s) past the first reminder threshold")
+        
+        try:
+            self._remind_batch(unpaid_invoices, now_ts, now_iso, cutoff_ts)
+        finally:
+            self.save_state()
+    
+    def _reminder_cutoff(self, now_ts: int) -> int:
+        """Latest due date that can have passed the first reminder threshold"""
+        # Invoices due after this can never trigger a reminder yet
+        return now_ts - self._thresholds[0] * SECONDS_PER_DAY
+    
+    def _remind_batch(self, unpaid_invoices: List[Dict], now_ts: int, now_iso: str, cutoff_ts: int):
+        """Send every due reminder for a batch of unpaid invoices"""
+        invoices_state = self.state['invoices']
+        
+        # Drop invoices that cannot get a reminder before any per-invoice work
+        max_reminders = self.max_reminders
+        no_state = {'reminders_sent': 0}
+        candidates = [
+            invoice for invoice in unpaid_invoices
+            if invoice.get('due_date') and invoice['due_date'] <= cutoff_ts
+            and invoices_state.get(invoice['id'], no_state)['reminders_sent'] < max_reminders
+        ]
+        skipped = len(unpaid_invoices) - len(candidates)
+        if skipped:
+            print(f"⏭️  Skipping {skipped} invoice(s) too early to remind or at max reminders")
+        
+        # Decide what to send up front so the parallel phase is pure I/O
+        work = []
+        for invoice in candidates:
+            reminder_number = self._next_reminder(invoice, invoices_state, now_ts)
+            if reminder_number:
+                work.append((invoice, reminder_number))
+        
+        if not work:
+            return
+        
+        self._fill_customer_emails([invoice for invoice, _ in work])
+        workers = min(self.smtp_pool_size, len(work))
+        self._open_pool(workers)
+        
+        futures = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                try:
+                    for invoice, reminder_number in work:
+                        futures.append(executor.submit(self._send_and_update, invoice, reminder_number, now_ts))
+                    # One bad invoice must not abort the rest of the batch
+                    for (invoice, _), future in zip(work, futures):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            print(f"❌ Error processing invoice {invoice.get('number', invoice['id'])}: {e}")
+                except BaseException:
+                    # Interrupted: don't start sends nobody is waiting to record
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+        finally:
+            self._close_pool()
+            # Record every send that completed, including those that finished
+            # after an interrupt. Invoice state is only written here, on the
+            # calling thread; workers only touch state['customers'], under
+            # _state_lock.
+            for future in futures:
+                if not future.done() or future.cancelled() or future.exception() is not None:
+                    continue
+                invoice_id, sent, reminder_number = future.result()
+                if sent:
+                    invoice_state = invoices_state[invoice_id]
                     invoice_state['reminders_sent'] = reminder_number
-                    invoice_state['last_reminder'] = datetime.now().isoformat()
-                    self.save_state()
-                    print(f"✅ Reminder sent")
-                else:
-                    print(f"❌ Failed to send reminder")
-            else:
-                if reminders_sent >= self.max_reminders:
-                    print(f"⏭️  Max reminders reached for invoice {invoice.get('number', invoice_id)}")
-                elif days_since_due < min(self.reminder_days):
-                    print(f"⏭️  Too early to remind for invoice {invoice.get('number', invoice_id)}")
+                    invoice_state['last_reminder'] = now_iso
+    
+    def _next_reminder(self, invoice: Dict, invoices_state: Dict, now_ts: int) -> int:
+        """Return the reminder number due for an invoice, or 0 if none is"""
+        days_since_due = (now_ts - invoice['due_date']) // SECONDS_PER_DAY
+        
+        # Initialize invoice state if needed
+        invoice_state = invoices_state.setdefault(invoice['id'], {
+            'reminders_sent': 0,
+            'last_reminder': None
+        })
+        reminders_sent = invoice_state['reminders_sent']
+        
+        # Reminders are sent one threshold at a time, so the next one is due
+        # once the invoice has passed more thresholds than reminders sent
+        thresholds_passed = bisect.bisect_right(self._thresholds, days_since_due)
+        if reminders_sent < min(thresholds_passed, self.max_reminders):
+            return reminders_sent + 1
+        return 0
+    
+    def _send_and_update(self, invoice: Dict, reminder_number: int, now_ts: int) -> Tuple[str, bool, int]:
+        """Send one reminder and report the outcome for the state update"""
+        label = invoice.get('number', invoice['id'])
+        print(f"📧 Sending reminder #{reminder_number} for invoice {label}")
+        
+        sent = self.send_reminder_email(invoice, reminder_number, now_ts)
+        if sent:
+            print(f"✅ Reminder #{reminder_number} sent for invoice {label}")
+        else:
+            print(f"❌ Failed to send reminder #{reminder_number} for invoice {label}")
+        return invoice['id'], sent, reminder_number
     
     def list_unpaid(self):
         """List all unpaid invoices"""
-        unpaid = self.get_unpaid_invoices()
+        unpaid = list(self.get_unpaid_invoices())
         
         if not unpaid:
             print("✅ No unpaid invoices")
             return
         
-        print("\n" + "="*80)
-        print("UNPAID INVOICES")
-        print("="*80)
+        self._fill_customer_emails(unpaid)
         
+        # Build the whole report first and write it in one call
+        lines = ["", "="*80, "UNPAID INVOICES", "="*80]
+        
+        now_ts = int(time.time())
+        invoices_state = self.state['invoices']
         for invoice in unpaid:
-            due_date = datetime.fromtimestamp(invoice['due_date']) if invoice.get('due_date') else None
-            days_overdue = (datetime.now() - due_date).days if due_date else 0
+            due_ts = invoice.get('due_date')
+            days_overdue = (now_ts - due_ts) // SECONDS_PER_DAY if due_ts else 0
             
-            reminders_sent = self.state['invoices'].get(invoice['id'], {}).get('reminders_sent', 0)
+            invoice_state = invoices_state.get(invoice['id'])
+            reminders_sent = invoice_state['reminders_sent'] if invoice_state else 0
             
-            print(f"\nInvoice: {invoice.get('number', invoice['id'])}")
-            print(f"  Amount: {invoice['currency']} {invoice['amount_due']:.2f}")
-            print(f"  Customer: {invoice.get('customer_email', 'N/A')}")
-            if due_date:
-                print(f"  Due Date: {due_date.strftime('%Y-%m-%d')} ({days_overdue} days overdue)")
-            print(f"  Reminders Sent: {reminders_sent}/{self.max_reminders}")
+            lines.append(f"\nInvoice: {invoice.get('number', invoice['id'])}")
+            lines.append(f"  Amount: {invoice['currency']} {invoice['amount_due']:.2f}")
+            lines.append(f"  Customer: {invoice.get('customer_email') or 'N/A'}")
+            if due_ts:
+                due_date = time.strftime('%Y-%m-%d', time.localtime(due_ts))
+                lines.append(f"  Due Date: {due_date} ({days_overdue} days overdue)")
+            lines.append(f"  Reminders Sent: {reminders_sent}/{self.max_reminders}")
+        
+        sys.stdout.write("\n".join(lines) + "\n")
     
     def send_manual_reminder(self, invoice_id: str):
         """Send manual reminder for specific invoice"""
@@ -264,7 +593,13 @@ class InvoiceReminderBot:
         
         print(f"📧 Sending manual reminder for invoice {invoice.get('number', invoice_id)}")
         
-        if self.send_reminder_email(invoice, reminder_number):
+        self._open_pool(1)
+        try:
+            sent = self.send_reminder_email(invoice, reminder_number)
+        finally:
+            self._close_pool()
+        
+        if sent:
             invoice_state['reminders_sent'] = reminder_number
             invoice_state['last_reminder'] = datetime.now().isoformat()
             self.state['invoices'][invoice_id] = invoice_state
@@ -276,15 +611,94 @@ class InvoiceReminderBot:
     def run_continuous(self, interval: int = 3600):
         """Run continuous monitoring"""
         print(f"🚀 Starting invoice reminder bot (checking every {interval}s)")
+        self._run_every(interval, self.check_and_remind)
+    
+    def _run_every(self, interval: int, task: Callable[[], None]):
+        """Run task now and then once per interval, without drifting
+        
+        A run that fails for a transient reason (Stripe still throttling or
+        unreachable after retries, an SMTP or network outage) is reported
+        and the loop carries on. Anything else propagates so the process
+        exits non-zero and its supervisor sees the failure.
+        """
+        next_run = time.monotonic()
+        while True:
+            try:
+                task()
+            except TRANSIENT_ERRORS as e:
+                print(f"❌ Error: {e}")
+            next_run += interval
+            delay = next_run - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # A run overran the interval; start counting again from now
+                next_run = time.monotonic()
+    
+    def _sync_events(self, open_invoices: Dict[str, Dict]) -> int:
+        """Apply invoice events since the last sync to the open invoice set"""
+        since = self.state['last_event_ts']
+        # gte re-reads the cursor's second so events sharing it are not
+        # missed; replaying events in order is harmless
+        params = {'types': INVOICE_EVENT_TYPES, 'created': {'gte': since}, 'limit': 100}
+        events = []
+        while True:
+            page = self._list_events(**params)
+            events.extend(page.data)
+            if not page.has_more or not page.data:
+                break
+            params['starting_after'] = page.data[-1].id
+        # Stripe lists newest first; reverse rather than sort on created,
+        # which ties for events in the same second
+        events.reverse()
         
-        schedule.every(interval).seconds.do(self.check_and_remind)
+        for event in events:
+            invoice = event.data.object
+            if event.type != 'invoice.deleted' and invoice.status == 'open' and invoice.amount_due > 0:
+                open_invoices[invoice.id] = self._invoice_row(invoice)
+            else:
+                open_invoices.pop(invoice.id, None)
+            since = max(since, event.created)
         
-        # Initial check
-        self.check_and_remind()
+        self.state['last_event_ts'] = since
+        return len(events)
+    
+    def run_events(self, interval: int = 3600):
+        """Run continuous monitoring driven by Stripe invoice events
         
-        while True:
-            schedule.run_pending()
-            time.sleep(60)
+        Open invoices are listed once, then kept current from invoice.*
+        events, so each poll costs O(changes) instead of O(open invoices).
+        """
+        if not STRIPE_AVAILABLE or not self.stripe_key:
+            print("⚠️  Stripe not configured")
+            return
+        
+        print(f"🚀 Starting invoice reminder bot (syncing events every {interval}s)")
+        
+        open_invoices = self.state.get('open_invoices')
+        last_event_ts = self.state.get('last_event_ts')
+        if open_invoices is None or not last_event_ts or time.time() - last_event_ts > EVENT_RETENTION_SECONDS:
+            print("🔄 Listing open invoices for a full resync...")
+            # Events are replayed in order, so starting early only costs re-reads;
+            # starting late would drop events if our clock runs ahead of Stripe's
+            self.state['last_event_ts'] = int(time.time()) - EVENT_RESYNC_MARGIN_SECONDS
+            open_invoices = {invoice['id']: invoice for invoice in self.get_unpaid_invoices()}
+        self.state['open_invoices'] = open_invoices
+        
+        self._run_every(interval, lambda: self._check_events(open_invoices))
+    
+    def _check_events(self, open_invoices: Dict[str, Dict]):
+        """Sync invoice events, then send reminders for the open invoice set"""
+        try:
+            changed = self._sync_events(open_invoices)
+            print(f"🔍 Applied {changed} invoice event(s), {len(open_invoices)} open invoice(s)")
+            
+            now_ts = int(time.time())
+            self._remind_batch(list(open_invoices.values()), now_ts,
+                               datetime.fromtimestamp(now_ts).isoformat(),
+                               self._reminder_cutoff(now_ts))
+        finally:
+            self.save_state()
 
 
 def main():
@@ -293,6 +707,8 @@ def main():
     parser.add_argument('--list-unpaid', action='store_true', help='List unpaid invoices')
     parser.add_argument('--remind', help='Send manual reminder for invoice ID')
     parser.add_argument('--interval', type=int, default=3600, help='Check interval in seconds')
+    parser.add_argument('--events', action='store_true',
+                        help='Track invoices from Stripe events instead of re-listing them each check')
     
     args = parser.parse_args()
     
@@ -305,6 +721,8 @@ def main():
             bot.send_manual_reminder(args.remind)
         elif args.check_once:
             bot.check_and_remind()
+        elif args.events:
+            bot.run_events(args.interval)
         else:
             bot.run_continuous(args.interval)
     except Exception as e:
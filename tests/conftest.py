@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import reminder_bot  # noqa: E402
+
+
+@pytest.fixture
+def bot(monkeypatch, tmp_path):
+    """Bot with Stripe and SMTP configured and its state file in tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('STRIPE_SECRET_KEY', 'sk_test')
+    monkeypatch.setenv('SMTP_USER', 'bot@example.com')
+    monkeypatch.setenv('SMTP_PASSWORD', 'secret')
+    return reminder_bot.InvoiceReminderBot()
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+import reminder_bot
+
+
+def make_invoice(status):
+    return SimpleNamespace(
+        id='in_1', customer='cus_1', amount_due=1000, currency='usd',
+        due_date=1000, customer_email='a@example.com', number='N1',
+        created=0, status=status
+    )
+
+
+def make_event(event_type, status, created):
+    return SimpleNamespace(type=event_type, data=SimpleNamespace(object=make_invoice(status)), created=created)
+
+
+class FakePage:
+    def __init__(self, events):
+        self.data = events
+        self.has_more = False
+
+
+def test_same_second_events_apply_oldest_first(bot, monkeypatch):
+    # Stripe returns newest first: paid happened after finalized
+    events = [make_event('invoice.paid', 'paid', 500), make_event('invoice.finalized', 'open', 500)]
+    monkeypatch.setattr(reminder_bot.stripe.Event, 'list', lambda **params: FakePage(events))
+    bot.state['last_event_ts'] = 500
+    open_invoices = {}
+
+    assert bot._sync_events(open_invoices) == 2
+    assert open_invoices == {}
+    assert bot.state['last_event_ts'] == 500
+
+
+def test_open_invoice_event_is_tracked(bot, monkeypatch):
+    events = [make_event('invoice.finalized', 'open', 700)]
+    monkeypatch.setattr(reminder_bot.stripe.Event, 'list', lambda **params: FakePage(events))
+    bot.state['last_event_ts'] = 500
+    open_invoices = {}
+
+    bot._sync_events(open_invoices)
+
+    assert open_invoices['in_1']['customer_email'] == 'a@example.com'
+    assert bot.state['last_event_ts'] == 700
+
+
+def test_run_every_survives_transient_failure_only(bot, monkeypatch):
+    calls = []
+
+    def task():
+        calls.append(1)
+        if len(calls) == 1:
+            raise reminder_bot.stripe.error.APIConnectionError('stripe down')
+        raise reminder_bot.stripe.error.AuthenticationError('key revoked')
+
+    monkeypatch.setattr(reminder_bot.time, 'sleep', lambda seconds: None)
+    with pytest.raises(reminder_bot.stripe.error.AuthenticationError):
+        bot._run_every(60, task)
+
+    assert len(calls) == 2
+
+
+def test_resync_cursor_starts_before_local_clock(bot, monkeypatch):
+    monkeypatch.setattr(reminder_bot.time, 'time', lambda: 10_000)
+    monkeypatch.setattr(bot, 'get_unpaid_invoices', lambda: iter([]))
+
+    def stop(interval, task):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(bot, '_run_every', stop)
+    with pytest.raises(KeyboardInterrupt):
+        bot.run_events(60)
+
+    assert bot.state['last_event_ts'] == 10_000 - reminder_bot.EVENT_RESYNC_MARGIN_SECONDS
@@ -0,0 +1,104 @@
+import pytest
+
+import reminder_bot
+
+DAY = reminder_bot.SECONDS_PER_DAY
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def sends(bot, monkeypatch):
+    """Record reminders instead of emailing them, reporting each as sent"""
+    sent = []
+
+    def send_and_update(invoice, reminder_number, now_ts):
+        sent.append((invoice['id'], reminder_number))
+        return invoice['id'], True, reminder_number
+
+    monkeypatch.setattr(bot, '_send_and_update', send_and_update)
+    return sent
+
+
+def make_invoice(due_date, invoice_id='in_1'):
+    return {
+        'id': invoice_id, 'customer_id': 'cus_1', 'amount_due': 10.0, 'currency': 'USD',
+        'due_date': due_date, 'customer_email': 'a@example.com', 'number': invoice_id, 'created': 0
+    }
+
+
+def run_pass(bot, invoices):
+    bot._remind_batch(invoices, NOW, '2023-11-14T22:13:20', bot._reminder_cutoff(NOW))
+
+
+def test_long_overdue_invoice_gets_reminders_one_at_a_time(bot, sends):
+    invoice = make_invoice(NOW - 30 * DAY)
+
+    run_pass(bot, [invoice])
+    assert sends == [('in_1', 1)]
+
+    run_pass(bot, [invoice])
+    assert sends == [('in_1', 1), ('in_1', 2)]
+    assert bot.state['invoices']['in_1']['reminders_sent'] == 2
+
+
+def test_reminders_cap_at_threshold_count(bot, sends):
+    bot.max_reminders = 5
+    invoice = make_invoice(NOW - 30 * DAY)
+
+    for _ in range(5):
+        run_pass(bot, [invoice])
+
+    assert [number for _, number in sends] == [1, 2, 3]
+
+
+def test_reminders_cap_at_max_reminders(bot, sends):
+    bot.max_reminders = 2
+    invoice = make_invoice(NOW - 30 * DAY)
+
+    for _ in range(3):
+        run_pass(bot, [invoice])
+
+    assert [number for _, number in sends] == [1, 2]
+
+
+def test_unsorted_reminder_days_match_sorted(bot, monkeypatch):
+    monkeypatch.setenv('REMINDER_DAYS', '21,7,14')
+    unsorted_bot = reminder_bot.InvoiceReminderBot()
+
+    assert unsorted_bot._thresholds == bot._thresholds == (7, 14, 21)
+    for days in (6, 7, 13, 14, 20, 21, 30):
+        for reminders_sent in range(4):
+            invoice = make_invoice(NOW - days * DAY)
+            expected = bot._next_reminder(invoice, {'in_1': {'reminders_sent': reminders_sent}}, NOW)
+            actual = unsorted_bot._next_reminder(invoice, {'in_1': {'reminders_sent': reminders_sent}}, NOW)
+            assert actual == expected
+
+
+def test_cutoff_boundary(bot, sends):
+    on_cutoff = make_invoice(NOW - 7 * DAY, 'in_on')
+    just_after = make_invoice(NOW - 7 * DAY + 1, 'in_after')
+
+    run_pass(bot, [on_cutoff, just_after])
+
+    assert sends == [('in_on', 1)]
+
+
+def test_interrupted_batch_records_every_completed_send(bot, monkeypatch):
+    bot.smtp_pool_size = 1
+    sent = []
+
+    def send_and_update(invoice, reminder_number, now_ts):
+        if invoice['id'] == 'in_1':
+            raise KeyboardInterrupt
+        sent.append(invoice['id'])
+        return invoice['id'], True, reminder_number
+
+    monkeypatch.setattr(bot, '_send_and_update', send_and_update)
+    invoices = [make_invoice(NOW - 8 * DAY, f'in_{i}') for i in range(5)]
+
+    with pytest.raises(KeyboardInterrupt):
+        run_pass(bot, invoices)
+
+    recorded = [iid for iid, s in bot.state['invoices'].items() if s['reminders_sent']]
+    assert 'in_0' in recorded
+    assert sorted(recorded) == sorted(sent)
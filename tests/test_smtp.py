@@ -0,0 +1,147 @@
+import smtplib
+
+import pytest
+
+import reminder_bot
+
+
+class FakeSMTP:
+    """Stand-in for smtplib.SMTP that records what happens to it"""
+
+    instances = []
+    login_error = None
+
+    def __init__(self, host=None, port=None, **kwargs):
+        self.sent = []
+        self.quit_called = False
+        self.closed = False
+        self.fail_sends = 0
+        FakeSMTP.instances.append(self)
+
+    def ehlo(self):
+        pass
+
+    def starttls(self, context=None):
+        pass
+
+    def login(self, user, password):
+        if FakeSMTP.login_error:
+            raise FakeSMTP.login_error
+
+    def send_message(self, msg):
+        if self.fail_sends:
+            self.fail_sends -= 1
+            raise smtplib.SMTPServerDisconnected('connection dropped')
+        self.sent.append(msg)
+
+    def quit(self):
+        self.quit_called = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_smtp(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.login_error = None
+    monkeypatch.setattr(reminder_bot.smtplib, 'SMTP', FakeSMTP)
+    monkeypatch.setattr(reminder_bot.smtplib, 'SMTP_SSL', FakeSMTP)
+    return FakeSMTP
+
+
+def test_failed_login_closes_connection(bot):
+    FakeSMTP.login_error = smtplib.SMTPAuthenticationError(535, b'bad credentials')
+
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        bot._connect_smtp()
+
+    assert len(FakeSMTP.instances) == 1
+    assert FakeSMTP.instances[0].closed
+
+
+def test_pool_rotates_connection_after_max_msgs():
+    pool = reminder_bot.SMTPPool(FakeSMTP, size=1, max_msgs=2)
+
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    pool.release(first)
+
+    # The second send hit the cap, so the next acquire opens a fresh connection
+    assert first.quit_called
+    second = pool.acquire()
+    assert second is not first
+    pool.release(second)
+    pool.close()
+    assert second.quit_called
+
+
+def test_pool_replaces_broken_connection():
+    pool = reminder_bot.SMTPPool(FakeSMTP, size=1, max_msgs=100)
+
+    server = pool.acquire()
+    pool.release(server, broken=True)
+
+    assert server.quit_called
+    assert pool.acquire() is not server
+
+
+def test_pool_keeps_slot_when_connect_fails():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError('connection refused')
+        return FakeSMTP()
+
+    pool = reminder_bot.SMTPPool(connect, size=1)
+    with pytest.raises(OSError):
+        pool.acquire()
+
+    # The slot went back to the pool instead of leaving acquire() blocked forever
+    assert isinstance(pool.acquire(), FakeSMTP)
+
+
+def test_deliver_retries_once_on_stale_connection(bot):
+    bot._open_pool(1)
+    stale = bot._pool.acquire()
+    stale.fail_sends = 1
+    bot._pool.release(stale)
+
+    bot._deliver('message')
+
+    assert stale.quit_called
+    assert FakeSMTP.instances[-1] is not stale
+    assert FakeSMTP.instances[-1].sent == ['message']
+    bot._close_pool()
+
+
+def test_deliver_gives_up_after_second_failure(bot, monkeypatch):
+    def drop(self, msg):
+        raise smtplib.SMTPServerDisconnected('connection dropped')
+
+    monkeypatch.setattr(FakeSMTP, 'send_message', drop)
+    bot._open_pool(1)
+
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        bot._deliver('message')
+
+    assert len(FakeSMTP.instances) == 2
+    assert all(server.quit_called for server in FakeSMTP.instances)
+    bot._close_pool()
+
+
+def test_deliver_does_not_retry_other_errors(bot, monkeypatch):
+    def refuse(self, msg):
+        raise smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'no such user')})
+
+    monkeypatch.setattr(FakeSMTP, 'send_message', refuse)
+    bot._open_pool(1)
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        bot._deliver('message')
+
+    assert len(FakeSMTP.instances) == 1
+    bot._close_pool()
@@ -0,0 +1,26 @@
+import json
+import os
+
+import pytest
+
+import reminder_bot
+
+
+def test_save_state_round_trips(bot):
+    bot.state['invoices']['in_1'] = {'reminders_sent': 2, 'last_reminder': '2024-01-01T00:00:00'}
+    bot.save_state()
+
+    with open(bot.state_file) as f:
+        assert json.load(f)['invoices']['in_1']['reminders_sent'] == 2
+    assert bot.load_state() == bot.state
+
+
+def test_failed_replace_removes_temp_file(bot, monkeypatch, tmp_path):
+    def fail_replace(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(reminder_bot.os, 'replace', fail_replace)
+    with pytest.raises(OSError):
+        bot.save_state()
+
+    assert os.listdir(tmp_path) == []
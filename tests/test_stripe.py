@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+
+import reminder_bot
+
+errors = reminder_bot.stripe.error
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(reminder_bot.time, 'sleep', lambda seconds: None)
+
+
+def fake_list(monkeypatch, failures):
+    """Make Invoice.list raise each of failures in turn, then return one page"""
+    calls = []
+
+    def invoice_list(**params):
+        calls.append(params)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        invoice = SimpleNamespace(
+            id='in_1', customer='cus_1', amount_due=1000, currency='usd',
+            due_date=1000, customer_email='a@example.com', number='N1', created=0
+        )
+        return SimpleNamespace(data=[invoice], has_more=False)
+
+    monkeypatch.setattr(reminder_bot.stripe.Invoice, 'list', invoice_list)
+    return calls
+
+
+@pytest.mark.parametrize('error', [errors.RateLimitError('slow down'), errors.APIConnectionError('timeout')])
+def test_transient_stripe_errors_are_retried(bot, monkeypatch, error):
+    calls = fake_list(monkeypatch, [error, error])
+
+    invoices = list(bot.get_unpaid_invoices())
+
+    assert [invoice['id'] for invoice in invoices] == ['in_1']
+    assert len(calls) == 3
+
+
+def test_retries_give_up_after_five_attempts(bot, monkeypatch):
+    calls = fake_list(monkeypatch, [errors.APIConnectionError('timeout')] * 5)
+
+    with pytest.raises(errors.APIConnectionError):
+        list(bot.get_unpaid_invoices())
+
+    assert len(calls) == 5
+
+
+@pytest.mark.parametrize('error', [
+    errors.AuthenticationError('key revoked'),
+    errors.PermissionError('not allowed'),
+    errors.InvalidRequestError('bad param', 'due_date'),
+])
+def test_other_stripe_errors_propagate_without_retry(bot, monkeypatch, error):
+    calls = fake_list(monkeypatch, [error])
+
+    with pytest.raises(type(error)):
+        list(bot.get_unpaid_invoices())
+
+    assert len(calls) == 1